@@ -1,18 +1,67 @@
+import io
 import os
 import shutil
-import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import List
-from urllib.parse import urlparse
 from zipfile import ZipFile
 
 import numpy as np
 import pandas as pd
-import requests
 
 from lxml import etree
 
-from ..util import get_resource_index, mosmix_s_forecast_url
+from ..util import (
+    concat_frames,
+    get_resource_index,
+    mosmix_s_forecast_url,
+    request_timeout,
+    session,
+)
+
+# MOSMIX KML namespaces; identical across all published files.
+namespaces = {
+    "kml": "http://www.opengis.net/kml/2.2",
+    "dwd": "https://opendata.dwd.de/weather/lib/pointforecast_dwd_extension_V1_0.xsd",
+}
+
+product_definition_tag = f"{{{namespaces['dwd']}}}ProductDefinition"
+placemark_tag = f"{{{namespaces['kml']}}}Placemark"
+product_item_tags = {
+    "product_id": f"{{{namespaces['dwd']}}}ProductID",
+    "generating_process": f"{{{namespaces['dwd']}}}GeneratingProcess",
+    "date_issued": f"{{{namespaces['dwd']}}}IssueTime",
+}
+element_name_attr = f"{{{namespaces['dwd']}}}elementName"
+
+# Clark-notation paths for the per-station lookups; plain find/findtext/iterfind with
+# prebuilt tags avoid both per-call prefix resolution and XPath context setup.
+timesteps_path = (
+    f"{{{namespaces['dwd']}}}ForecastTimeSteps/{{{namespaces['dwd']}}}TimeStep"
+)
+name_path = f"{{{namespaces['kml']}}}name"
+description_path = f"{{{namespaces['kml']}}}description"
+coordinates_path = f"{{{namespaces['kml']}}}Point/{{{namespaces['kml']}}}coordinates"
+forecast_path = f"{{{namespaces['kml']}}}ExtendedData/{{{namespaces['dwd']}}}Forecast"
+
+
+def fetch_raw_forecast_zip(url):
+    """
+    Fetch weather forecast file (zipped xml) into memory and return it as an open ZipFile.
+    """
+    # Closing the streamed response hands its connection back to the pool, also on errors.
+    with session.get(url, stream=True, timeout=request_timeout) as r:
+        if r.status_code != 200:
+            raise ValueError(f"Fetching resource {url} failed")
+
+        buffer = io.BytesIO()
+        r.raw.decode_content = True
+        shutil.copyfileobj(r.raw, buffer, length=1 << 20)
+    buffer.seek(0)
+
+    return ZipFile(buffer, "r")
 
 
 def fetch_raw_forecast_xml(url, directory_path):
@@ -21,21 +70,20 @@ def fetch_raw_forecast_xml(url, directory_path):
     """
     directory_path = Path(directory_path)
 
-    if not os.path.exists(directory_path):
-        os.makedirs(directory_path)
+    os.makedirs(directory_path, exist_ok=True)
 
-    r = requests.get(url, stream=True)
-    file_name = urlparse(url).path.replace("/", "__")
+    with fetch_raw_forecast_zip(url) as zipObj:
+        # Extract all the contents of zip file in current directory
+        zipObj.extractall(path=directory_path)
+        return directory_path / zipObj.namelist()[0]
 
-    if r.status_code == 200:
-        with open(directory_path / file_name, "wb") as f:
-            r.raw.decode_content = True
-            shutil.copyfileobj(r.raw, f)
 
-        with ZipFile(directory_path / file_name, "r") as zipObj:
-            # Extract all the contents of zip file in current directory
-            zipObj.extractall(path=directory_path)
-            return directory_path / zipObj.namelist()[0]
+def parse_measurement_values(measurement_string):
+    """
+    Parse a whitespace separated MOSMIX value string into a float32 array; "-" denotes a missing value.
+    """
+    tokens = np.array(measurement_string.split())
+    return np.where(tokens == "-", "nan", tokens).astype(np.float32)
 
 
 def convert_xml_to_pandas(
@@ -46,103 +94,155 @@ def convert_xml_to_pandas(
 ):
     """
     Convert DWD XML Weather Forecast File of Type MOSMIX_S to parquet files.
+    `filepath` may be a path or an open binary file object, e.g. a member of the downloaded zip.
     """
 
-    tree = etree.parse(str(filepath))
-    root = tree.getroot()
+    if station_ids is not None:
+        station_ids = frozenset(station_ids)
+        stations_remaining = set(station_ids)
+
+    metadata = None
+    timesteps = None
+    # Per parameter, the value arrays of all selected stations (None where a station lacks it).
+    measurement_columns = {}
+    station_id_list = []
+    station_list = []
+
+    # Stream the document: the product definition precedes all placemarks, and each
+    # element is discarded once processed, so memory use stays at roughly one station.
+    context = etree.iterparse(
+        filepath if hasattr(filepath, "read") else str(filepath),
+        events=("end",),
+        tag=(product_definition_tag, placemark_tag),
+        huge_tree=True,
+        collect_ids=False,
+        remove_blank_text=True,
+        remove_comments=True,
+        remove_pis=True,
+    )
+
+    for _, elem in context:
+        if elem.tag == product_definition_tag:
+            # Get Basic Metadata
+            metadata = {k: elem.findtext(v) for k, v in product_item_tags.items()}
+            metadata["date_issued"] = pd.Timestamp(metadata["date_issued"])
+
+            # Get Time Steps
+            timesteps = pd.to_datetime(
+                [i.text for i in elem.iterfind(timesteps_path)], utc=True, cache=True
+            )
 
-    prod_items = {
-        "product_id": "ProductID",
-        "generating_process": "GeneratingProcess",
-        "date_issued": "IssueTime",
-    }
+        else:
+            # Get Per Station Forecasts
+            station_id = elem.findtext(name_path)
+
+            if return_station_data:
+                geo_lon, geo_lat, height = elem.findtext(coordinates_path).split(",")
+                station_list.append(
+                    {
+                        "station_id": station_id,
+                        "station_name": elem.findtext(description_path),
+                        "geo_lon": geo_lon,
+                        "geo_lat": geo_lat,
+                        "height": height,
+                    }
+                )
 
-    # Get Basic Metadata
-    prod_definition = root.findall(
-        "kml:Document/kml:ExtendedData/dwd:ProductDefinition", root.nsmap
-    )[0]
+            if (station_ids is None) or station_id in station_ids:
+                measurement_list = elem.iterfind(forecast_path)
 
-    metadata = {
-        k: prod_definition.find(f"{{{root.nsmap['dwd']}}}{v}").text
-        for k, v in prod_items.items()
-    }
-    metadata["date_issued"] = pd.Timestamp(metadata["date_issued"])
+                for measurement_item in measurement_list:
 
-    # Get Time Steps
-    timesteps = root.findall(
-        "kml:Document/kml:ExtendedData/dwd:ProductDefinition/dwd:ForecastTimeSteps",
-        root.nsmap,
-    )[0]
-    timesteps = [pd.Timestamp(i.text) for i in timesteps.getchildren()]
+                    measurement_parameter = measurement_item.get(element_name_attr)
 
-    # Get Per Station Forecasts
-    forecast_items = root.findall("kml:Document/kml:Placemark", root.nsmap)
+                    if parameters is None or measurement_parameter in parameters:
 
-    df_list = []
+                        # dwd:value is the only child of dwd:Forecast.
+                        measurement_values = parse_measurement_values(
+                            measurement_item[0].text
+                        )
 
-    for station_forecast in forecast_items:
-        station_id = station_forecast.find("kml:name", root.nsmap).text
+                        assert len(measurement_values) == len(
+                            timesteps
+                        ), "Number of timesteps does not match number of measurement values."
+                        measurement_columns.setdefault(
+                            measurement_parameter, [None] * len(station_id_list)
+                        ).append(measurement_values)
 
-        if (station_ids is None) or station_id in station_ids:
-            measurement_list = station_forecast.findall(
-                "kml:ExtendedData/dwd:Forecast", root.nsmap
-            )
-            df = pd.DataFrame({"date_start": timesteps})
+                station_id_list.append(station_id)
+                for values in measurement_columns.values():
+                    if len(values) < len(station_id_list):
+                        values.append(None)
 
-            for measurement_item in measurement_list:
+                if station_ids is not None:
+                    stations_remaining.discard(station_id)
 
-                measurement_parameter = measurement_item.get(
-                    f"{{{root.nsmap['dwd']}}}elementName"
-                )
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+        # Once every requested station has been read, skip the rest of the file.
+        if (
+            station_ids is not None
+            and not stations_remaining
+            and not return_station_data
+        ):
+            break
 
-                if parameters is None or measurement_parameter in parameters:
+    del context
 
-                    measurement_string = measurement_item.getchildren()[0].text
+    # Assemble each output column with a single contiguous copy, rather than building
+    # and concatenating one DataFrame per station; date_start and station_id are the
+    # shared timesteps and the station ids laid out station by station.
+    n_stations = len(station_id_list)
+    missing_values = np.full(len(timesteps), np.nan, dtype=np.float32)
 
-                    measurement_values = " ".join(measurement_string.split()).split(" ")
-                    measurement_values = [
-                        np.nan if i == "-" else float(i) for i in measurement_values
-                    ]
+    def stack(values):
+        return np.concatenate([missing_values if v is None else v for v in values])
 
-                    assert len(measurement_values) == len(
-                        timesteps
-                    ), "Number of timesteps does not match number of measurement values."
-                    df[measurement_parameter] = measurement_values
+    # Column order follows the former per-station concat: the first station's parameters,
+    # then station id and metadata, then parameters that only appear at later stations.
+    columns = {"date_start": timesteps[np.tile(np.arange(len(timesteps)), n_stations)]}
+    for measurement_parameter, values in measurement_columns.items():
+        if values[0] is not None:
+            columns[measurement_parameter] = stack(values)
+    columns["station_id"] = np.repeat(station_id_list, len(timesteps))
 
-            df["station_id"] = station_id
-            for k, v in metadata.items():
-                df[k] = v
+    df = pd.DataFrame(columns, copy=False)
 
-            df_list.append(df)
+    # Constant metadata is attached once to the combined frame, not broadcast per station.
+    for k, v in metadata.items():
+        df[k] = v
 
-    df = pd.concat(df_list, axis=0)
+    for measurement_parameter, values in measurement_columns.items():
+        if values[0] is None:
+            df[measurement_parameter] = stack(values)
 
     if return_station_data:
-        station_df = [
-            {
-                "coordinates": station_forecast.find(
-                    "kml:Point/kml:coordinates", root.nsmap
-                ).text.split(","),
-                "station_id": station_forecast.find("kml:name", root.nsmap).text,
-                "station_name": station_forecast.find(
-                    "kml:description", root.nsmap
-                ).text,
-            }
-            for station_forecast in forecast_items
-        ]
-        station_df = pd.DataFrame(station_df)
-        station_df["geo_lon"] = station_df["coordinates"].apply(lambda x: float(x[0]))
-        station_df["geo_lat"] = station_df["coordinates"].apply(lambda x: float(x[1]))
-        station_df["height"] = station_df["coordinates"].apply(lambda x: float(x[2]))
-        del station_df["coordinates"]
+        station_df = pd.DataFrame(station_list).astype(
+            {"geo_lon": "float64", "geo_lat": "float64", "height": "float64"}
+        )
 
         return df, station_df
     else:
         return df
 
 
-def get_data(station_ids=None, parameters=None):
-    """Fetch weather forecast data (KML/MOSMIX_S dataset).
+def get_data_from_url(url, station_ids=None, parameters=None):
+    """
+    Fetch a single MOSMIX file and convert it to a DataFrame; the xml is decompressed while parsing, never written to disk.
+    """
+    with fetch_raw_forecast_zip(url) as zipObj:
+        with zipObj.open(zipObj.namelist()[0]) as kml_file:
+            return convert_xml_to_pandas(
+                kml_file, station_ids, parameters, return_station_data=False
+            )
+
+
+def iter_data(station_ids=None, parameters=None, max_workers=8):
+    """Fetch weather forecast data (KML/MOSMIX_S dataset) as one DataFrame per forecast file.
+    Arguments are checked and the forecast files are listed right away; the returned
+    iterator then downloads and parses the files as it is consumed.
     Parameters
     ----------
     station_ids : List
@@ -150,8 +250,9 @@ def get_data(station_ids=None, parameters=None):
 
     parameters: List
         If not None, list of parameters, per MOSMIX definition, here: https://www.dwd.de/DE/leistungen/opendata/help/schluessel_datenformate/kml/mosmix_elemente_pdf.pdf?__blob=publicationFile&v=2
-    run_checks :
-        Checks that all aspects of the data request are valid.
+    max_workers : int
+        Number of forecast files downloaded and parsed concurrently; this also bounds how
+        many files are held in memory at once.
 
     """
     if station_ids:
@@ -164,16 +265,36 @@ def get_data(station_ids=None, parameters=None):
 
     urls = get_resource_index(mosmix_s_forecast_url)
 
-    df_list = []
-    for url in urls:
-        with tempfile.TemporaryDirectory() as tmp_dir_name:
-            kml_path = fetch_raw_forecast_xml(url, tmp_dir_name)
-            df = convert_xml_to_pandas(
-                kml_path, station_ids, parameters, return_station_data=False
-            )
+    return _iter_data_from_urls(urls, station_ids, parameters, max_workers)
+
+
+def _iter_data_from_urls(urls, station_ids, parameters, max_workers):
+    """Yield one DataFrame per url, with a bounded number of files in flight."""
+    # Each worker downloads and parses one file. Parsing is mostly Python code holding the
+    # GIL, so the pool's gain is overlapping downloads and decompression with parsing.
+    fetch = partial(get_data_from_url, station_ids=station_ids, parameters=parameters)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = deque()
+        for url in urls:
+            futures.append(executor.submit(fetch, url))
+            if len(futures) > max_workers:
+                yield futures.popleft().result()
+
+        while futures:
+            yield futures.popleft().result()
+
+
+def get_data(station_ids=None, parameters=None):
+    """Fetch weather forecast data (KML/MOSMIX_S dataset).
+    Parameters
+    ----------
+    station_ids : List
+        If not None, station_ids are a list of station ids for which data is desired. If None, data for all stations is returned.
 
-        df_list.append(df)
+    parameters: List
+        If not None, list of parameters, per MOSMIX definition, here: https://www.dwd.de/DE/leistungen/opendata/help/schluessel_datenformate/kml/mosmix_elemente_pdf.pdf?__blob=publicationFile&v=2
 
-    df = pd.concat(df_list, axis=0)
+    """
+    df = concat_frames(list(iter_data(station_ids, parameters)))
 
     return df
@@ -1,3 +1,6 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List
 from urllib.parse import urljoin
@@ -5,18 +8,28 @@ from urllib.parse import urljoin
 import pandas as pd
 
 from ..util import (
+    concat_frames,
     germany_climate_url,
+    get_resource_content,
     get_resource_index,
     measurement_colnames_kv,
     measurement_coltypes_kv,
     measurement_datetypes_kv,
+    measurement_metadata,
+    request_timeout,
+    session,
     station_colnames_kv,
     station_coltypes_kv,
     station_datetypes_kv,
+    station_metadata,
     y2k_date_parser,
 )
 
 na_values = ["-999", "-999   "]
+# Station ids appear in data file names as a five digit field, e.g. `_00003_`.
+data_file_station_pattern = re.compile(r"_(\d{5})(?=_)")
+# Historical data files end in `_<first date>_<last date>_hist.zip`.
+hist_file_pattern = re.compile(r"_(\d{8})_(\d{8})_hist\.zip$")
 # Hierarchical Structure
 # - resolution -> measurement -> time bucket -> station availability
 
@@ -80,22 +93,47 @@ def get_stations(resolution: str, parameter: str) -> pd.DataFrame:
         df = get_stations_list_from_url(resource_url)
         resource_df_list.append(df)
 
-    resource_df = pd.concat(resource_df_list, axis=0)
-    resource_df.drop_duplicates(inplace=True)
+    resource_df = concat_frames(resource_df_list)
+    # Stations appear in several buckets (now, recent, historical); keep the most recent entry.
+    resource_df = resource_df.sort_values(["station_id", "date_end"]).drop_duplicates(
+        subset="station_id", keep="last"
+    )
     return resource_df
 
 
 def get_measurement_data_from_url(url: str):
+    response = session.get(url, timeout=request_timeout)
+    if response.status_code != 200:
+        raise ValueError(f"Fetching resource {url} failed")
+
+    return parse_measurement_data(response.content)
+
+
+def parse_measurement_data(content: bytes):
+    """
+    Parse a zipped DWD measurement data file.
+
+    :param bytes content: body of a `*.zip` data file holding a single csv
+    :returns: DataFrame of measurements with UTC `date_start`
+    """
+
     df = pd.read_csv(
-        url,
+        io.BytesIO(content),
+        compression="zip",
         sep=";",
-        dtype=measurement_coltypes_kv,
+        dtype={
+            **measurement_coltypes_kv,
+            **{k: "str" for k in measurement_datetypes_kv},
+        },
         encoding="utf-8",
-        parse_dates=measurement_datetypes_kv,
         skipinitialspace=True,
-        date_parser=lambda col: y2k_date_parser(col, date_format="%Y%m%d%H%M"),
         na_values=na_values,
     )
+    # Parse dates as whole columns after reading, rather than via read_csv's date_parser hook.
+    for col in measurement_datetypes_kv:
+        df[col] = y2k_date_parser(
+            df[col], date_format=measurement_metadata[col]["format"]
+        )
     df.drop(columns="eor", inplace=True, errors="ignore")
     df.rename(columns=measurement_colnames_kv, inplace=True)
     df["station_id"] = df.station_id.str.zfill(
@@ -106,19 +144,48 @@ def get_measurement_data_from_url(url: str):
 
 
 def get_stations_list_from_url(url: str):
-    col_names = pd.read_csv(url, sep=" ", encoding="latin1", nrows=0).columns.tolist()
-
-    df = pd.read_fwf(
-        url,
-        header=None,
-        names=col_names,
-        dtype=station_coltypes_kv,  # TODO: Figure out how to handle nullables...
-        encoding="latin1",
-        skiprows=2,
-        parse_dates=station_datetypes_kv,
-        date_parser=lambda col: y2k_date_parser(col, date_format="%Y%m%d"),
-        na_values=na_values,
-    )
+    # Station lists change rarely; only download them again when the server reports a change.
+    return parse_stations_list(get_resource_content(url))
+
+
+def station_line_pattern(col_names):
+    """
+    Build the regex splitting station description rows with the given header columns.
+    Every field is a single token except the free-text station name, which may contain spaces.
+    """
+    fields = [r"(.+?)" if col == "Stationsname" else r"(\S+)" for col in col_names]
+    return re.compile(r"^" + r"\s+".join(fields) + r"\s*$")
+
+
+def parse_stations_list(content: bytes):
+    """
+    Parse a DWD station description file (`*Beschreibung_Stationen.txt`).
+
+    :param bytes content: latin1 encoded body of the station description file
+    :returns: DataFrame with one row per station
+    """
+
+    lines = content.decode("latin1").splitlines()
+    col_names = lines[0].split()
+
+    # Skip header and dashed separator line; split every row in one vectorized regex pass.
+    rows = pd.Series([line for line in lines[2:] if line.strip()], dtype="object")
+    df = rows.str.extract(station_line_pattern(col_names))
+    unmatched = df.isna().any(axis=1)
+    if unmatched.any():
+        raise ValueError(
+            f"Unexpected station description row: {rows[unmatched].iloc[0]!r}"
+        )
+    df.columns = col_names
+    # Columns DWD adds over time (e.g. `Abgabe`) are not part of the station metadata.
+    df = df[list(station_metadata)]
+    df = df.mask(df.isin(na_values))
+    df = df.astype(
+        {k: v for k, v in station_coltypes_kv.items() if v != "str"}
+    )  # TODO: Figure out how to handle nullables...
+
+    for col in station_datetypes_kv:
+        df[col] = y2k_date_parser(df[col], date_format=station_metadata[col]["format"])
 
     df.rename(columns=station_colnames_kv, inplace=True)
     df["station_id"] = df.station_id.str.zfill(
@@ -128,6 +195,27 @@ def get_stations_list_from_url(url: str):
     return df
 
 
+def hist_file_overlaps(url: str, date_start=None, date_end=None) -> bool:
+    """
+    Check, using the date span in its file name, whether a historical data file can hold rows in [date_start, date_end).
+    Files without a date span (recent and now buckets) are always kept.
+    """
+    match = hist_file_pattern.search(url)
+    if match is None:
+        return True
+
+    file_start, file_end = (pd.Timestamp(d, tz="UTC") for d in match.groups())
+
+    # File names carry calendar dates; pad by a day so pre-2000 CET offsets never drop a file.
+    if date_start and file_end + pd.Timedelta("2 days") <= date_start:
+        return False
+
+    if date_end and file_start - pd.Timedelta("1 day") >= date_end:
+        return False
+
+    return True
+
+
 def get_measurement_data_urls(resolution, parameter):
     available_resources = __gather_resource_files(resolution, parameter)
 
@@ -181,17 +269,6 @@ def get_data(
         if station_ids:
             assert isinstance(station_ids, list), "station_ids must be None or a list"
             station_ids = [str(station_id) for station_id in station_ids]
-            available_stations = (
-                get_stations(resolution, parameter)["station_id"].unique().tolist()
-            )
-            missing_stations = [
-                station_id
-                for station_id in station_ids
-                if station_id not in available_stations
-            ]
-            assert (
-                len(missing_stations) == 0
-            ), f"""`station_ids` '{"', '".join(missing_stations)}', do(es) not exist."""
 
         if date_start:
             assert isinstance(
@@ -205,9 +282,29 @@ def get_data(
 
     urls = get_measurement_data_urls(resolution, parameter)
 
+    if run_checks and station_ids:
+        # Data file names carry the station id, so the listing already fetched suffices;
+        # no station description files need to be downloaded.
+        available_stations = {
+            s_id for u in urls for s_id in data_file_station_pattern.findall(u)
+        }
+        missing_stations = [
+            station_id
+            for station_id in station_ids
+            if station_id not in available_stations
+        ]
+        assert (
+            len(missing_stations) == 0
+        ), f"""`station_ids` '{"', '".join(missing_stations)}', do(es) not exist."""
+
     # Filter Station Ids
     if station_ids:
-        urls = [u for u in urls if any([f"_{s_id}_" in u for s_id in station_ids])]
+        station_id_set = set(station_ids)
+        urls = [
+            u
+            for u in urls
+            if station_id_set.intersection(data_file_station_pattern.findall(u))
+        ]
 
     # Filter on Time
     if date_start and date_start > pd.Timestamp.today(tz="UTC") - pd.Timedelta(
@@ -218,8 +315,10 @@ def get_data(
     if date_end and date_end.year < pd.Timestamp.now(tz="UTC").year:
         urls = [u for u in urls if "_akt.zip" not in u and "_now.zip" not in u]
 
-    df_list = []
-    for url in urls:
+    if date_start or date_end:
+        urls = [u for u in urls if hist_file_overlaps(u, date_start, date_end)]
+
+    def fetch_and_filter(url):
         df = get_measurement_data_from_url(url)
 
         if date_start:
@@ -228,9 +327,13 @@ def get_data(
         if date_end:
             df = df.loc[df.date_start < date_end]
 
-        df_list.append(df)
+        return df
+
+    # Downloads are I/O bound, so fetch files concurrently; filtering per file keeps memory bounded.
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        df_list = list(executor.map(fetch_and_filter, urls))
 
-    df = pd.concat(df_list, axis=0)
+    df = concat_frames(df_list)
 
     # Drop Duplicate Rows (Due to Overlap Between Historical & Recent Data); Keep Row with Highest QN (Qualitätsniveau)
     df = df.sort_values(["station_id", "date_start", "QN"])
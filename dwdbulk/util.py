@@ -1,14 +1,33 @@
-from html.parser import HTMLParser
+from functools import lru_cache
+from importlib import resources
 from urllib.parse import urljoin
 
 import pandas as pd
-import pkg_resources
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from lxml import etree, html
 
 
 # DWD CDC HTTP server.
 baseurl = "https://opendata.dwd.de/"
 
+# Shared HTTP session, so repeated requests to the DWD server reuse pooled connections.
+session = requests.Session()
+session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.5),
+    ),
+)
+# Seconds to wait for the server before giving up on a request.
+request_timeout = 60
+# Bodies and validators of resources fetched via get_resource_content, keyed by url.
+resource_content_cache = {}
+
 station_metadata = {
     "Stations_id": {"name": "station_id", "type": "str"},
     "von_datum": {"name": "date_start", "type": "date", "format": "%Y%m%d"},
@@ -22,9 +41,9 @@ station_metadata = {
 
 station_colnames_kv = {k: v["name"] for k, v in station_metadata.items()}
 station_coltypes_kv = {
-    k: v["type"] for k, v in station_metadata.items() if v["type"] is not "date"
+    k: v["type"] for k, v in station_metadata.items() if v["type"] != "date"
 }
-station_datetypes_kv = [k for k, v in station_metadata.items() if v["type"] is "date"]
+station_datetypes_kv = [k for k, v in station_metadata.items() if v["type"] == "date"]
 
 measurement_metadata = {
     "STATIONS_ID": {"name": "station_id", "type": "str"},
@@ -39,10 +58,10 @@ measurement_metadata = {
 
 measurement_colnames_kv = {k: v["name"] for k, v in measurement_metadata.items()}
 measurement_coltypes_kv = {
-    k: v["type"] for k, v in measurement_metadata.items() if v["type"] is not "date"
+    k: v["type"] for k, v in measurement_metadata.items() if v["type"] != "date"
 }
 measurement_datetypes_kv = [
-    k for k, v in measurement_metadata.items() if v["type"] is "date"
+    k for k, v in measurement_metadata.items() if v["type"] == "date"
 ]
 
 
@@ -54,23 +73,12 @@ mosmix_s_forecast_url = urljoin(
     baseurl, "weather/local_forecasts/mos/MOSMIX_S/all_stations/kml/"
 )
 
+# Link targets of a directory listing, as plain strings rather than lxml smart strings.
+href_xpath = etree.XPath("//a/@href", smart_strings=False)
+
 
 def parse_htmllist(baseurl, content, extension=None, full_url=True):
-    class ListParser(HTMLParser):
-        def __init__(self):
-            HTMLParser.__init__(self)
-            self.data = []
-
-        def handle_starttag(self, tag, attrs):
-            if tag == "a":
-                for attr in attrs:
-                    if attr[0] == "href" and attr[1] != "../":
-                        self.data.append(attr[1])
-
-    parser = ListParser()
-    parser.feed(content)
-    paths = parser.data
-    parser.close()
+    paths = [path for path in href_xpath(html.fromstring(content)) if path != "../"]
 
     if extension:
         paths = [path for path in paths if extension in path]
@@ -89,17 +97,69 @@ def get_resource_index(url, extension="", full_url=True):
     :params str extension: String that should be matched in the link list; if "", all are returned
     """
 
-    response = requests.get(url)
+    # Listings change over time (new forecast runs appear hourly), so they are revalidated
+    # with the server on every call; parsing is only redone when the content changed.
+    content = get_resource_content(url)
+    return list(_parse_resource_index(url, content, extension, full_url))
+
+
+@lru_cache(maxsize=128)
+def _parse_resource_index(url, content, extension, full_url):
+    """Parse a link list once per distinct content; cached as a tuple so callers cannot mutate it."""
+
+    return tuple(parse_htmllist(url, content, extension, full_url))
+
+
+def get_resource_content(url):
+    """
+    Fetch the body of a small resource, revalidating a previously fetched copy via ETag / Last-Modified.
+
+    :params str url: url of the resource
+    :returns: response body as bytes; an unchanged resource is served from memory without being downloaded again
+    """
+
+    cached = resource_content_cache.get(url)
+    headers = {}
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = session.get(url, headers=headers, timeout=request_timeout)
+    if response.status_code == 304 and cached is not None:
+        return cached["content"]
     if response.status_code != 200:
         raise ValueError(f"Fetching resource {url} failed")
-    resource_list = parse_htmllist(url, response.text, extension, full_url)
-    return resource_list
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        resource_content_cache[url] = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "content": response.content,
+        }
+    return response.content
+
+
+def concat_frames(df_list):
+    """Concatenate DataFrames row-wise; a single frame is returned as is, skipping the copy."""
+    if len(df_list) == 1:
+        return df_list[0]
+    return pd.concat(df_list, axis=0, ignore_index=True, copy=False)
 
 
 def get_stations_lookup():
     """Return station lookup."""
-    csv_file = pkg_resources.resource_filename("dwdbulk", "station_lookup.csv")
-    return pd.read_csv(csv_file, dtype=str)
+    # The bundled csv is parsed once per process; callers get a copy they may modify.
+    return _read_stations_lookup().copy()
+
+
+@lru_cache(maxsize=1)
+def _read_stations_lookup():
+    with resources.open_binary("dwdbulk", "station_lookup.csv") as csv_file:
+        return pd.read_csv(csv_file, dtype=str)
 
 
 def y2k_date_parser(col, date_format="%Y%m%d%H%M"):
@@ -108,15 +168,21 @@ def y2k_date_parser(col, date_format="%Y%m%d%H%M"):
     y2k = pd.Timestamp("2000-01-01")
 
     col_raw = pd.to_datetime(col, format=date_format)
-    col_raw = col_raw.to_series(keep_tz=True).reset_index(drop=True)
+    # A Series parses to a Series with the same index, so it can be assigned back to its frame.
+    if not isinstance(col_raw, pd.Series):
+        col_raw = col_raw.to_series().reset_index(drop=True)
 
     pre_y2k_bool = col_raw < y2k
+    col_utc = col_raw.dt.tz_localize(tz="UTC")
+
+    # Recent files hold no pre-2000 dates; skip the CET pass for them entirely.
+    if not pre_y2k_bool.any():
+        return col_utc
 
-    col_raw[pre_y2k_bool] = (
-        col_raw[pre_y2k_bool]
-        .dt.tz_localize(tz="CET", ambiguous="NaT", nonexistent="NaT")
-        .dt.tz_convert("UTC")
-    )
-    col_raw[~pre_y2k_bool] = col_raw[~pre_y2k_bool].dt.tz_localize(tz="UTC")
+    # Localize the whole column both ways and pick per row, so the column never holds
+    # a mix of naive and tz-aware values (which degrades it to object dtype).
+    col_cet = col_raw.dt.tz_localize(
+        tz="CET", ambiguous="NaT", nonexistent="NaT"
+    ).dt.tz_convert("UTC")
 
-    return pd.to_datetime(col_raw, utc=True)
+    return col_utc.where(~pre_y2k_bool, col_cet)
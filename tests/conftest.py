@@ -0,0 +1,34 @@
+import os
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+import requests_cache
+
+from dwdbulk import util
+from dwdbulk.api import forecasts, observations
+
+
+@pytest.fixture(scope="session", autouse=True)
+def http_cache():
+    """Serve repeated DWD requests from an on-disk cache shared by all tests of a worker."""
+    # One cache file per xdist worker, so worker processes never write to the same database.
+    worker_id = os.environ.get("PYTEST_XDIST_WORKER", "master")
+    # Short expiry, so that tests asserting on recent observations still see fresh data.
+    cached_session = requests_cache.CachedSession(
+        str(Path(__file__).parent / f".http_cache_{worker_id}"),
+        backend="sqlite",
+        expire_after=timedelta(minutes=30),
+    )
+    cached_session.mount("https://", util.session.get_adapter(util.baseurl))
+
+    modules = [util, observations, forecasts]
+    original_sessions = [module.session for module in modules]
+    for module in modules:
+        module.session = cached_session
+
+    yield cached_session
+
+    for module, original_session in zip(modules, original_sessions):
+        module.session = original_session
+    cached_session.close()
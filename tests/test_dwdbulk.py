@@ -1,12 +1,17 @@
+import io
 import random
+import zipfile
+from collections import Counter
 from pathlib import Path
 from urllib.parse import urljoin
 
+import numpy as np
 import pandas as pd
-import requests
 
 import pytest
-from dwdbulk.api import observations
+from dwdbulk import util
+from dwdbulk.api import forecasts, observations
+from dwdbulk.api.forecasts import convert_xml_to_pandas
 from dwdbulk.api.observations import (
     __gather_resource_files,
     get_measurement_data_from_url,
@@ -15,6 +20,9 @@ from dwdbulk.api.observations import (
     get_resolutions,
     get_stations,
     get_stations_list_from_url,
+    hist_file_overlaps,
+    parse_measurement_data,
+    parse_stations_list,
 )
 from dwdbulk.util import (
     germany_climate_url,
@@ -25,6 +33,9 @@ from dwdbulk.util import (
     y2k_date_parser,
 )
 
+# Three MOSMIX_S placemarks: 01008 lacks FF and is the first to carry RR1c.
+mosmix_s_sample_path = Path(__file__).parent / "data" / "MOSMIX_S_sample.kml"
+
 measurement_parameters_10_minutes = [
     "air_temperature",
     "extreme_temperature",
@@ -72,44 +83,50 @@ resolution_and_measurement_standards = {
     # "subdaily": [],
 }
 
+# Parametrize matrices, built once at collection time and shared by the tests below.
+resolutions_with_parameters = [
+    k for k, v in resolution_and_measurement_standards.items() if v != []
+]
+# Only the first parameter of each resolution runs by default; the rest of the grid is
+# marked slow and runs in the scheduled build (pytest -m "slow or not slow").
+resolution_parameter_matrix = [
+    pytest.param(k, v_i, id=f"{k}-{v_i}", marks=pytest.mark.slow if i > 0 else ())
+    for k, v in resolution_and_measurement_standards.items()
+    for i, v_i in enumerate(v)
+]
 
-@pytest.mark.parametrize(
-    "resolution",
-    [k for k, v in resolution_and_measurement_standards.items() if v != []],
-)
+
+@pytest.mark.parametrize("resolution", resolutions_with_parameters)
 def test_parse_htmllist(resolution):
     url = urljoin(
         "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/",
         resolution,
     )
-    r = requests.get(url)
+    r = util.session.get(url)
     extracted_links = parse_htmllist(url, r.text)
 
-    expected_links = resolution_and_measurement_standards[resolution]
+    prefix = f"{germany_climate_url}{resolution}/"
     expected_links = [
-        urljoin(germany_climate_url, str(Path(resolution) / link) + "/")
-        for link in expected_links
+        f"{prefix}{link}/" for link in resolution_and_measurement_standards[resolution]
     ]
-    assert sorted(extracted_links) == sorted(expected_links)
+    assert Counter(extracted_links) == Counter(expected_links)
 
 
 def test_get_resource_index():
-    url = urljoin(germany_climate_url, "10_minutes/")
+    url = f"{germany_climate_url}10_minutes/"
     extracted_links = get_resource_index(url, "/")
 
-    expected_links = resolution_and_measurement_standards["10_minutes"]
-    expected_links = [urljoin(url, link + "/") for link in expected_links]
+    expected_links = [
+        f"{url}{link}/" for link in resolution_and_measurement_standards["10_minutes"]
+    ]
 
-    assert sorted(extracted_links) == sorted(expected_links)
+    assert Counter(extracted_links) == Counter(expected_links)
 
 
-@pytest.mark.parametrize(
-    "resolution,parameter",
-    [(k, v_i) for k, v in resolution_and_measurement_standards.items() for v_i in v],
-)
+@pytest.mark.parametrize("resolution,parameter", resolution_parameter_matrix)
 def test_gather_resource_files_helper(resolution, parameter):
     files = __gather_resource_files(resolution, parameter)
-    assert len([x for x in files if "Beschreibung_Stationen.txt" in x]) > 0
+    assert any("Beschreibung_Stationen.txt" in x for x in files)
 
 
 def test_get_resource_all():
@@ -120,7 +137,7 @@ def test_get_resource_all():
     extracted_links = get_resource_index(germany_climate_url)
 
     expected_links = [
-        urljoin(germany_climate_url, link + "/")
+        f"{germany_climate_url}{link}/"
         for link in resolution_and_measurement_standards.keys()
     ]
     assert set(expected_links).issubset(extracted_links)
@@ -154,21 +171,8 @@ def test_get_measurement_parameters(resolution, expected_measurement_parameters)
         assert j in extracted_measurement_parameters
 
 
-@pytest.mark.parametrize(
-    "resolution,parameter",
-    [(k, v_i) for k, v in resolution_and_measurement_standards.items() for v_i in v],
-)
-def test_get_stations(resolution, parameter):
-    "Test fetching station data. Test randomly chooses a measurement parameter for each of the three supported time frames."
-    # If measurement parameters not currently specified, then skip test.
-    if parameter == []:
-        return
-
-    df = get_stations(resolution, parameter)
-
-    assert df.date_start.min() > pd.Timestamp("1700-01-01", tz="UTC")
-    assert df.date_start.max() < pd.Timestamp("2200-01-01", tz="UTC")
-    states = [
+allowed_states = frozenset(
+    [
         "Baden-Württemberg",
         "Nordrhein-Westfalen",
         "Hessen",
@@ -187,29 +191,61 @@ def test_get_stations(resolution, parameter):
         "Hamburg",
         "Tirol",
     ]
-    assert set(df.state.unique()).issubset(set(states))
+)
 
-    assert df.height.min() >= 0
-    assert df.geo_lat.min() >= -90
-    assert df.geo_lat.max() <= 90
 
-    assert df.geo_lon.min() >= -180
-    assert df.geo_lon.max() <= 180
+@pytest.fixture(
+    scope="session",
+    params=[
+        pytest.param(p.values, id=p.id, marks=p.marks)
+        for p in resolution_parameter_matrix
+    ],
+)
+def stations_df(request):
+    """Station list for each (resolution, parameter) pair, fetched once per session."""
+    resolution, parameter = request.param
+    return get_stations(resolution, parameter)
+
+
+def test_get_stations(stations_df):
+    "Test fetching station data for each supported resolution and measurement parameter."
+    df = stations_df
+
+    stats = df.agg(
+        {
+            "date_start": ["min", "max"],
+            "height": "min",
+            "geo_lat": ["min", "max"],
+            "geo_lon": ["min", "max"],
+        }
+    )
+
+    assert stats.loc["min", "date_start"] > pd.Timestamp("1700-01-01", tz="UTC")
+    assert stats.loc["max", "date_start"] < pd.Timestamp("2200-01-01", tz="UTC")
+    assert allowed_states.issuperset(df.state.unique().tolist())
+
+    assert stats.loc["min", "height"] >= 0
+    assert stats.loc["min", "geo_lat"] >= -90
+    assert stats.loc["max", "geo_lat"] <= 90
+
+    assert stats.loc["min", "geo_lon"] >= -180
+    assert stats.loc["max", "geo_lon"] <= 180
 
     expected_colnames = [v["name"] for k, v in station_metadata.items()]
-    assert sorted(df.columns) == sorted(expected_colnames)
+    assert len(df.columns) == len(expected_colnames)
+    assert set(df.columns) == set(expected_colnames)
     assert df.shape[0] > 5
 
 
-@pytest.mark.parametrize(
-    "resolution,parameter",
-    [(k, v_i) for k, v in resolution_and_measurement_standards.items() for v_i in v],
-)
+@pytest.mark.parametrize("resolution,parameter", resolution_parameter_matrix)
 def test_get_measurement_data_urls_and_data(resolution, parameter):
     files = get_measurement_data_urls(resolution, parameter)
     assert len(files) > 0
 
-    files_sample = random.sample(files, 2)
+    # Only the last frame is asserted on, so download a single file. Seed per
+    # test case (str seeds are stable across processes, unlike hash()) so
+    # repeat runs request the same URL and hit the HTTP cache.
+    files_sample = random.Random(f"{resolution}-{parameter}").sample(files, 1)
 
     for url in files_sample:
         df = get_measurement_data_from_url(url)
@@ -301,3 +337,265 @@ def test_y2k_datetime_parser_for_pre_2000_dates():
     )
 
     pd.testing.assert_series_equal(date_test, date_expect)
+
+
+def test_y2k_datetime_parser_keeps_series_index():
+    col = pd.Series(["199901010230", "201801010130"], index=[3, 7])
+
+    date_test = y2k_date_parser(col)
+
+    date_expect = pd.Series(
+        pd.to_datetime(["1999-01-01 01:30", "2018-01-01 01:30"], utc=True),
+        index=[3, 7],
+    )
+    pd.testing.assert_series_equal(date_test, date_expect)
+
+
+def test_y2k_datetime_parser_without_pre_2000_dates():
+    date_test = y2k_date_parser(pd.Series(["201801010130", "202103280230"]))
+
+    date_expect = pd.Series(
+        pd.to_datetime(["2018-01-01 01:30", "2021-03-28 02:30"], utc=True)
+    )
+    pd.testing.assert_series_equal(date_test, date_expect)
+
+
+def test_parse_measurement_data():
+    """Test parsing a zipped measurement csv, offline."""
+    csv = (
+        "STATIONS_ID;MESS_DATUM;  QN;PP_10;TT_10;TM5_10;RF_10;TD_10;eor\n"
+        "          3;199901011230;    1;  987.3;   2.9;   1.4;  93.0;   1.9;eor\n"
+        "          3;202001011230;    2;   -999;   3.5;   2.1;  91.0;   2.2;eor\n"
+    )
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as zip_file:
+        zip_file.writestr("produkt_zehn_min_tu_19990101_20200101_00003.txt", csv)
+
+    df = parse_measurement_data(content.getvalue())
+
+    assert "eor" not in df.columns
+    assert df.station_id.tolist() == ["00003", "00003"]
+    assert df.date_start.tolist() == [
+        pd.Timestamp("1999-01-01 11:30", tz="UTC"),
+        pd.Timestamp("2020-01-01 12:30", tz="UTC"),
+    ]
+    assert df.PP_10.isna().tolist() == [False, True]
+    assert df.TT_10.tolist() == [2.9, 3.5]
+
+
+def test_parse_stations_list():
+    """Test parsing a station description file, offline."""
+    content = (
+        "Stations_id von_datum bis_datum Stationshoehe geoBreite geoLaenge Stationsname Bundesland\r\n"
+        "----------- --------- --------- ------------- --------- --------- ----------------------------------------- ----------\r\n"
+        "00003 19930429 20110331            202     50.7827    6.0941 Aachen                                   Nordrhein-Westfalen \r\n"
+        "00044 20070209 20210101             44     52.9336    8.2370 Großenkneten                             Niedersachsen \r\n"
+        "00150 19981101 20210101            542        -999    7.9637 Bad Marienberg                           Rheinland-Pfalz \r\n"
+    ).encode("latin1")
+
+    df = parse_stations_list(content)
+
+    assert df.columns.tolist() == [v["name"] for v in station_metadata.values()]
+    assert df.station_id.tolist() == ["00003", "00044", "00150"]
+    assert df.name.tolist() == ["Aachen", "Großenkneten", "Bad Marienberg"]
+    assert df.state.tolist() == [
+        "Nordrhein-Westfalen",
+        "Niedersachsen",
+        "Rheinland-Pfalz",
+    ]
+    assert df.height.tolist() == [202, 44, 542]
+    assert df.geo_lat.isna().tolist() == [False, False, True]
+    assert df.geo_lon.tolist() == [6.0941, 8.2370, 7.9637]
+    assert df.date_start.tolist() == [
+        pd.Timestamp("1993-04-28 22:00", tz="UTC"),
+        pd.Timestamp("2007-02-09", tz="UTC"),
+        pd.Timestamp("1998-10-31 23:00", tz="UTC"),
+    ]
+    assert (df.date_end == pd.Timestamp("2021-01-01", tz="UTC")).tolist() == [
+        False,
+        True,
+        True,
+    ]
+
+
+def test_parse_stations_list_extra_column():
+    """Test that columns beyond the station metadata, like `Abgabe`, are dropped."""
+    content = (
+        "Stations_id von_datum bis_datum Stationshoehe geoBreite geoLaenge Stationsname Bundesland Abgabe\r\n"
+        "----------- --------- --------- ------------- --------- --------- ----------------------------------------- ---------- ------\r\n"
+        "00150 19981101 20210101            542     50.6581    7.9637 Bad Marienberg                           Rheinland-Pfalz                          Frei \r\n"
+        "\r\n"
+    ).encode("latin1")
+
+    df = parse_stations_list(content)
+
+    assert df.columns.tolist() == [v["name"] for v in station_metadata.values()]
+    assert df.name.tolist() == ["Bad Marienberg"]
+    assert df.state.tolist() == ["Rheinland-Pfalz"]
+
+
+def test_parse_stations_list_rejects_malformed_rows():
+    content = (
+        "Stations_id von_datum bis_datum Stationshoehe geoBreite geoLaenge Stationsname Bundesland\r\n"
+        "----------- --------- --------- ------------- --------- --------- ----------------------------------------- ----------\r\n"
+        "00003 19930429 20110331            202     50.7827    6.0941 Nordrhein-Westfalen \r\n"
+    ).encode("latin1")
+
+    with pytest.raises(ValueError, match="00003"):
+        parse_stations_list(content)
+
+
+def test_hist_file_overlaps():
+    url = "https://opendata.dwd.de/climate_environment/CDC/observations_germany/climate/10_minutes/air_temperature/historical/10minutenwerte_TU_00003_19930428_19991231_hist.zip"
+
+    assert hist_file_overlaps(url)
+    assert hist_file_overlaps(url, date_start=pd.Timestamp("1999-12-31", tz="UTC"))
+    assert not hist_file_overlaps(url, date_start=pd.Timestamp("2001-01-01", tz="UTC"))
+    assert hist_file_overlaps(url, date_end=pd.Timestamp("1993-05-01", tz="UTC"))
+    assert not hist_file_overlaps(url, date_end=pd.Timestamp("1990-01-01", tz="UTC"))
+
+    recent_url = url.replace("historical", "recent").replace(
+        "19930428_19991231_hist", "akt"
+    )
+    assert hist_file_overlaps(
+        recent_url, date_start=pd.Timestamp("2001-01-01", tz="UTC")
+    )
+
+
+def test_convert_xml_to_pandas():
+    """Test parsing a MOSMIX_S KML file, offline.
+
+    Values are float32 (they used to be float64), and a parameter missing at a station
+    is filled with NaN.
+    """
+    df = convert_xml_to_pandas(mosmix_s_sample_path)
+
+    # Parameters first seen at a later station follow the metadata columns.
+    assert df.columns.tolist() == [
+        "date_start",
+        "TTT",
+        "FF",
+        "station_id",
+        "product_id",
+        "generating_process",
+        "date_issued",
+        "RR1c",
+    ]
+    assert df.shape == (9, 8)
+    assert df.station_id.tolist() == ["01001"] * 3 + ["01008"] * 3 + ["10015"] * 3
+    timesteps = [
+        pd.Timestamp(f"2021-02-18 {hour}:00", tz="UTC") for hour in (10, 11, 12)
+    ]
+    assert df.date_start.tolist() == timesteps * 3
+    assert (df.product_id == "MOSMIX").all()
+    assert (df.date_issued == pd.Timestamp("2021-02-18 09:00", tz="UTC")).all()
+
+    for parameter in ["TTT", "FF", "RR1c"]:
+        assert df[parameter].dtype == np.float32
+    np.testing.assert_array_equal(
+        df.TTT,
+        np.array(
+            [271.55, 271.65, np.nan, 263.25, 263.15, 263.05, 278.35, 278.45, 278.55],
+            dtype=np.float32,
+        ),
+    )
+    np.testing.assert_array_equal(
+        df.FF,
+        np.array(
+            [5.14, 6.17, 7.20, np.nan, np.nan, np.nan, 8.23, 8.74, 9.26],
+            dtype=np.float32,
+        ),
+    )
+    np.testing.assert_array_equal(
+        df.RR1c,
+        np.array([np.nan] * 3 + [0.0, np.nan, 0.1] + [np.nan] * 3, dtype=np.float32),
+    )
+
+
+def test_convert_xml_to_pandas_station_subset():
+    """Test that parsing stops once all requested stations have been read."""
+    content = mosmix_s_sample_path.read_bytes()
+    # Cut the document off after the second placemark; reading past it would fail.
+    truncated = content[: content.index(b"<kml:Placemark>", content.index(b"01008"))]
+
+    df = convert_xml_to_pandas(
+        io.BytesIO(truncated), station_ids=["01008"], parameters=["TTT"]
+    )
+
+    assert df.station_id.unique().tolist() == ["01008"]
+    assert "TTT" in df.columns
+    assert "RR1c" not in df.columns
+    np.testing.assert_array_equal(
+        df.TTT, np.array([263.25, 263.15, 263.05], dtype=np.float32)
+    )
+
+
+def test_convert_xml_to_pandas_unknown_station():
+    """Test that unmatched station ids give an empty frame (this used to raise ValueError)."""
+    df = convert_xml_to_pandas(mosmix_s_sample_path, station_ids=["99999"])
+
+    assert df.empty
+    assert {"date_start", "station_id", "date_issued"}.issubset(df.columns)
+
+
+def test_convert_xml_to_pandas_station_data():
+    """Test that station data covers all stations, regardless of the station filter."""
+    df, station_df = convert_xml_to_pandas(
+        mosmix_s_sample_path, station_ids=["10015"], return_station_data=True
+    )
+
+    assert df.station_id.unique().tolist() == ["10015"]
+    expected_station_df = pd.DataFrame(
+        {
+            "station_id": ["01001", "01008", "10015"],
+            "station_name": ["JAN MAYEN", "SVALBARD", "HELGOLAND"],
+            "geo_lon": [-8.67, 15.47, 7.90],
+            "geo_lat": [70.93, 78.25, 54.18],
+            "height": [10.0, 28.0, 4.0],
+        }
+    )
+    pd.testing.assert_frame_equal(station_df, expected_station_df)
+
+
+def test_convert_xml_to_pandas_from_zip_member():
+    """Test parsing straight from the member of a downloaded zip, as get_data_from_url does."""
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.write(mosmix_s_sample_path, "MOSMIX_S_2021021809_240.kml")
+
+    with zipfile.ZipFile(content) as zip_file:
+        with zip_file.open(zip_file.namelist()[0]) as kml_file:
+            df = convert_xml_to_pandas(kml_file)
+
+    pd.testing.assert_frame_equal(df, convert_xml_to_pandas(mosmix_s_sample_path))
+
+
+def test_forecasts_iter_data_checks_arguments_eagerly():
+    with pytest.raises(AssertionError):
+        forecasts.iter_data(station_ids="01001")
+
+    with pytest.raises(AssertionError):
+        forecasts.iter_data(parameters="TTT")
+
+
+def test_forecasts_iter_data_bounds_files_in_flight(monkeypatch):
+    """Test that results come back in url order with at most max_workers + 1 files pending."""
+    urls = [f"MOSMIX_S_{i:02d}.kml.zip" for i in range(20)]
+    max_workers = 3
+    fetched = []
+
+    def fake_get_data_from_url(url, station_ids=None, parameters=None):
+        fetched.append(url)
+        return url
+
+    monkeypatch.setattr(forecasts, "get_data_from_url", fake_get_data_from_url)
+
+    results = []
+    for i, result in enumerate(
+        forecasts._iter_data_from_urls(urls, None, None, max_workers)
+    ):
+        # Before yielding result i, no file past url i + max_workers has been submitted.
+        assert len(fetched) <= i + max_workers + 1
+        results.append(result)
+
+    assert results == urls